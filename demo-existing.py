@@ -1,5 +1,5 @@
 import streamlit as st
-import json
+import orjson
 import os
 from pathlib import Path
 
@@ -8,22 +8,71 @@ from pathlib import Path
 st.set_page_config(layout="wide", page_title="法務文件摘要系統")
 
 # --- 資料載入 ---
-# 使用 @st.cache_data 快取資料，加速 App 回應速度
-@st.cache_data
-def load_all_json_data(data_folder):
-    """從指定資料夾載入所有 JSON 檔案"""
-    json_files = sorted(list(Path(data_folder).glob("*.json"))) # 排序檔案
-    all_data = []
-    for file_path in json_files:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            try:
-                data = json.load(f)
-                # 將檔案名稱也存入，方便除錯
-                data['filename'] = file_path.name
-                all_data.append(data)
-            except json.JSONDecodeError:
-                st.error(f"檔案 {file_path.name} 格式錯誤，無法解析。")
-    return all_data
+# summarize.py 產生的案件清單檔名
+MANIFEST_FILE = "_manifest.json"
+
+def index_cases(all_data):
+    """建立案號清單與案號到案件資料的對照表；案號重複時保留第一筆"""
+    cases_by_number = {}
+    for case in all_data:
+        cases_by_number.setdefault(case.get("case_number", "未知案號"), case)
+    return tuple(cases_by_number), cases_by_number
+
+def read_json_file(file_path):
+    """以二進位模式讀取 JSON，交由 orjson 直接從 bytes 解析；格式錯誤時回傳 None"""
+    with open(file_path, 'rb') as f:
+        try:
+            return orjson.loads(f.read())
+        except orjson.JSONDecodeError:
+            st.error(f"檔案 {file_path.name} 格式錯誤，無法解析。")
+            return None
+
+def folder_signature(data_folder):
+    """
+    以資料夾與案件清單的修改時間作為快取版本。summarize.py 以 os.replace 寫入檔案，
+    任何案件 JSON 新增或改寫都會更新資料夾的 mtime，因此只需兩次 stat 即可判斷是否需重新載入。
+    """
+    manifest_path = Path(data_folder) / MANIFEST_FILE
+    manifest_mtime = manifest_path.stat().st_mtime_ns if manifest_path.exists() else 0
+    return max(Path(data_folder).stat().st_mtime_ns, manifest_mtime)
+
+# 使用 @st.cache_resource 直接回傳快取中的物件，省去 cache_data 每次命中時的序列化複製；
+# mtime_sig 改變時自動重新載入，只保留最新一份
+@st.cache_resource(max_entries=1)
+def load_manifest(data_folder, mtime_sig):
+    """
+    載入 summarize.py 產生的案件清單 (只含案號、案由、URL 與檔名)，回傳案號清單與案號對照表。
+    清單產生後才放入資料夾的 JSON 不在清單中，這些檔案 (以及尚未產生清單時的所有檔案)
+    會退回逐一讀取，建立同樣格式的項目後併入清單。
+    """
+    manifest_path = Path(data_folder) / MANIFEST_FILE
+    entries = (read_json_file(manifest_path) or []) if manifest_path.exists() else []
+    listed = {entry.get("base_name") for entry in entries}
+
+    for file_path in sorted(Path(data_folder).glob("*.json")): # 排序檔案
+        # 略過底線開頭的內部檔案 (例如案件清單、summarize.py 的 Batch 記錄) 與清單中已有的案件
+        if file_path.name.startswith('_') or file_path.stem in listed:
+            continue
+        data = read_json_file(file_path)
+        if data is not None:
+            entries.append({
+                "case_number": data.get("case_number", "未知案號"),
+                "case_reason": data.get("case_reason"),
+                "url": data.get("url"),
+                "base_name": file_path.stem
+            })
+    return index_cases(entries)
+
+# 同樣以檔案 mtime 作為快取鍵；限制筆數避免瀏覽過的案件無限累積在記憶體中
+@st.cache_resource(max_entries=256)
+def load_case_detail(data_folder, base_name, mtime_ns):
+    """只讀取使用者選取之案件的完整 JSON (回傳的物件為共用快取，請勿修改)"""
+    file_path = Path(data_folder) / f"{base_name}.json"
+    data = read_json_file(file_path)
+    if data is not None:
+        # 將檔案名稱也存入，方便除錯
+        data['filename'] = file_path.name
+    return data
 
 # --- 主程式 ---
 # 假設您的 JSON 檔案都放在名為 'data' 的資料夾中
@@ -34,7 +83,7 @@ if not os.path.exists(DATA_FOLDER) or not os.listdir(DATA_FOLDER):
     st.error(f"錯誤：找不到資料夾 '{DATA_FOLDER}' 或資料夾為空。請建立此資料夾並將您的 JSON 檔案放入其中。")
     # 為了讓 App 能在沒有資料夾時也能預覽，我們建立一個假的範例資料
     st.info("正在使用範例資料進行預覽...")
-    all_cases_data = [{
+    case_numbers, cases_by_number = index_cases([{
       "case_number": "114年度破抗字第2號 (範例)",
       "url": "https://law.judicial.gov.tw/FJUD/default.aspx", # 加上範例 URL
       "case_reason": "宣告破產",
@@ -53,16 +102,15 @@ if not os.path.exists(DATA_FOLDER) or not os.listdir(DATA_FOLDER):
           "granularity": "實務見解",
           "text": "法院就破產之聲請，應依職權為必要之調查，倘債務人確係毫無財產可構成破產財團，或債務人之財產不敷清償破產財團之費用及財團之債務，而無從依破產程序清理其債務時，始得以無宣告破產之實益，裁定駁回聲請。"
         }]
-    }]
+    }])
 else:
-    all_cases_data = load_all_json_data(DATA_FOLDER)
+    case_numbers, cases_by_number = load_manifest(DATA_FOLDER, folder_signature(DATA_FOLDER))
 
 # --- 側邊欄 (Sidebar) ---
 st.sidebar.title("案件列表")
-st.sidebar.markdown(f"共找到 **{len(all_cases_data)}** 筆案件")
+st.sidebar.markdown(f"共找到 **{len(case_numbers)}** 筆案件")
 
 # 【需求1】建立一個以 "案號" 為選項的條列式清單
-case_numbers = [case.get("case_number", "未知案號") for case in all_cases_data]
 # 使用 st.radio 來建立一個不能收合的選擇列表
 selected_case_number = st.sidebar.radio(
     "請選擇要檢視的案件：", 
@@ -71,7 +119,17 @@ selected_case_number = st.sidebar.radio(
 )
 
 # 根據選擇的案號，找到對應的完整資料
-selected_case_data = next((case for case in all_cases_data if case.get("case_number") == selected_case_number), None)
+selected_entry = cases_by_number.get(selected_case_number)
+if selected_entry is not None and "base_name" in selected_entry:
+    # 案件清單只含側邊欄所需欄位，選取後才讀取該案件的完整 JSON
+    detail_path = Path(DATA_FOLDER) / f"{selected_entry['base_name']}.json"
+    if detail_path.exists():
+        selected_case_data = load_case_detail(DATA_FOLDER, selected_entry["base_name"], detail_path.stat().st_mtime_ns)
+    else:
+        st.error(f"找不到檔案 {detail_path.name}，案件清單可能已過期。")
+        selected_case_data = None
+else:
+    selected_case_data = selected_entry
 
 
 # --- 主畫面 (Main Panel) ---
@@ -97,8 +155,8 @@ if selected_case_data:
     st.subheader("事實爭點")
     factual_issues = selected_case_data.get('factual_issues', [])
     if factual_issues:
-        for issue in factual_issues:
-            st.markdown(f"- {issue}")
+        # 合併成單一 markdown 一次渲染，避免每個項目各產生一個元件
+        st.markdown("\n".join(f"- {issue}" for issue in factual_issues))
     else:
         st.info("此案件無事實爭點資訊。")
     
@@ -108,12 +166,11 @@ if selected_case_data:
     st.subheader("法律見解")
     legal_holdings = selected_case_data.get('legal_holdings', [])
     if legal_holdings:
-        for holding in legal_holdings:
-            category = holding.get('category', '無分類')
-            granularity = holding.get('granularity', '無位階')
-            text = holding.get('text', '無內容')
-            # 將所有資訊用 markdown 格式化成一行，更簡潔
-            st.markdown(f"- **【{category} - {granularity}】** {text}")
+        # 將每則見解用 markdown 格式化成一行，更簡潔；全部合併後一次渲染
+        st.markdown("\n".join(
+            f"- **【{holding.get('category', '無分類')} - {holding.get('granularity', '無位階')}】** {holding.get('text', '無內容')}"
+            for holding in legal_holdings
+        ))
     else:
         st.info("此案件無法律見解資訊。")
 
@@ -1,8 +1,9 @@
 import os
-import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException
+import asyncio
+import httpx
+import lxml.html
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
 # --- 設定 ---
 
@@ -13,15 +14,201 @@ URL_FILE = 'url.txt'
 OUTPUT_DIR = 'selenium_scraped_txt' # 資料夾名稱改為 _txt 以示區別
 
 # 您指定的 XPath
-XPATH_SELECTOR = '/html/body/form/div[3]/div[3]/div[1]' 
+XPATH_SELECTOR = '/html/body/form/div[3]/div[3]/div[1]'
 
-# 每個頁面載入後等待的秒數
-WAIT_SECONDS = 2
+# 等待指定區塊出現的逾時毫秒數 (取代固定等待秒數)
+WAIT_TIMEOUT_MS = 10000
 
+# 同時開啟的頁面數量上限
+MAX_CONCURRENCY = 5
 
-def download_with_selenium():
+# 原本的流程需等待動態內容渲染，尚未確認判決書內文不執行 JavaScript 也能取得，因此預設仍使用 Playwright。
+# 確認以 httpx.get 取得 url.txt 中任一網址的原始 HTML 已包含目標區塊的內文後，
+# 可將此設為 False，改用不需瀏覽器、快得多的 HTTP 模式
+REQUIRES_JS = True
+
+# HTTP 模式下的連線池上限
+HTTP_MAX_CONNECTIONS = 50
+
+# HTTP 請求逾時秒數
+HTTP_TIMEOUT_SECONDS = 30
+
+# 會在 innerText 中換行的區塊元素
+BLOCK_TAGS = {'div', 'p', 'pre', 'table', 'tr', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+
+
+def save_content(idx, url, content_text):
+    """
+    將網址與抓取到的內容寫入 content_{idx}.txt。
+    """
+    # 建立輸出檔案名稱，副檔名改回 .txt
+    output_filename = os.path.join(OUTPUT_DIR, f'content_{idx}.txt')
+
+    # 將網址和內容寫入同一個 txt 檔案
+    with open(output_filename, 'w', encoding='utf-8') as outfile:
+        # 第一行寫入來源網址
+        outfile.write(f"{url}\n")
+        # 第二行寫入分隔線
+        outfile.write("---\n")
+        # 接著寫入完整的內容
+        outfile.write(content_text)
+
+    return output_filename
+
+
+async def scrape_one(page, url, idx, total):
+    """
+    以已開啟的分頁前往網址，等待 XPath 區塊出現後擷取其文字。
+    """
+    print(f"正在處理第 {idx}/{total} 個網址: {url}")
+    try:
+        await page.goto(url, wait_until="domcontentloaded")
+
+        # 等待指定元素出現即繼續，不再固定等待
+        selector = f"xpath={XPATH_SELECTOR}"
+        await page.wait_for_selector(selector, timeout=WAIT_TIMEOUT_MS)
+        content_text = await page.locator(selector).inner_text()
+
+        output_filename = save_content(idx, url, content_text)
+        print(f"成功提取資料並儲存至 '{output_filename}'\n")
+
+    except PlaywrightTimeoutError:
+        print(f"警告：在此網址上找不到指定的 XPath 元素: {url}\n")
+
+
+async def browser_worker(ctx, queue, total):
+    """
+    持有一個預熱好的 BrowserContext 與分頁，持續從佇列取出網址處理，
+    讓所有網址共用同一個分頁，不必每次重新建立。
+    """
+    page = await ctx.new_page()
+    try:
+        while True:
+            idx, url = await queue.get()
+            try:
+                await scrape_one(page, url, idx, total)
+            except Exception as e:
+                print(f"錯誤：處理網址時發生未預期的錯誤: {url}\n{e}\n")
+            finally:
+                queue.task_done()
+    finally:
+        await page.close()
+
+
+async def download_with_playwright(urls):
+    """
+    使用 Playwright 並行讀取網址，抓取網址與指定區塊的文字，並儲存為 TXT 檔案。
+    """
+    queue = asyncio.Queue()
+    for i, url in enumerate(urls):
+        queue.put_nowait((i + 1, url))
+
+    async with async_playwright() as pw:
+        # 只啟動一個瀏覽器，並預先建立 MAX_CONCURRENCY 個 BrowserContext 作為工作池 (遠比開新瀏覽器便宜)
+        browser = await pw.chromium.launch()
+        print("Chromium 瀏覽器已啟動...")
+        print("-" * 20)
+
+        try:
+            contexts = [await browser.new_context() for _ in range(MAX_CONCURRENCY)]
+            workers = [asyncio.create_task(browser_worker(ctx, queue, len(urls))) for ctx in contexts]
+
+            # 等待佇列清空；若工作者全部異常結束 (例如瀏覽器崩潰、無法開啟分頁)，也要停止等待，避免永遠卡住
+            join_task = asyncio.create_task(queue.join())
+            alive = set(workers)
+            while alive:
+                done, _ = await asyncio.wait({join_task, *alive}, return_when=asyncio.FIRST_COMPLETED)
+                if join_task in done:
+                    break
+                for worker in done:
+                    if worker.exception():
+                        print(f"錯誤：瀏覽器工作者異常結束: {worker.exception()}\n")
+                alive -= done
+
+            if not join_task.done():
+                print(f"錯誤：所有瀏覽器工作者皆已停止，尚有 {queue.qsize()} 個網址未處理。")
+                join_task.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(join_task, *workers, return_exceptions=True)
+
+        finally:
+            # 無論程式是否出錯，最後都確保關閉瀏覽器
+            print("所有網址處理完畢，關閉瀏覽器。")
+            await browser.close()
+
+
+def extract_text(node):
     """
-    主執行函式：使用 Selenium 讀取網址，抓取網址與指定區塊的HTML，並儲存為 TXT 檔案。
+    取出元素的文字內容，並在 <br> 與區塊元素處補上換行，使結果接近瀏覽器的 innerText。
+    """
+    for element in node.iter():
+        if element.tag == 'br' or element.tag in BLOCK_TAGS:
+            element.tail = "\n" + (element.tail or "")
+    return node.text_content().strip()
+
+
+def is_retryable_http_error(exc):
+    """
+    只有連線層錯誤與 429 / 5xx 回應值得重試；404、403 等用戶端錯誤重試也不會成功。
+    """
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        status_code = exc.response.status_code
+        return status_code == 429 or status_code >= 500
+    return False
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, max=10),
+    retry=retry_if_exception(is_retryable_http_error),
+    reraise=True
+)
+async def fetch_html(client, url):
+    """
+    下載頁面 HTML；連線錯誤、429 或 5xx 回應時以指數退避重試。
+    """
+    response = await client.get(url)
+    response.raise_for_status()
+    return response.content
+
+
+async def fetch(client, url, idx, total):
+    """
+    以 HTTP 下載單一判決書頁面，並用 lxml 以 XPath 擷取指定區塊的文字。
+    """
+    print(f"正在處理第 {idx}/{total} 個網址: {url}")
+    html = await fetch_html(client, url)
+    nodes = lxml.html.fromstring(html).xpath(XPATH_SELECTOR)
+    if not nodes:
+        print(f"警告：在此網址上找不到指定的 XPath 元素: {url}\n")
+        return
+
+    output_filename = save_content(idx, url, extract_text(nodes[0]))
+    print(f"成功提取資料並儲存至 '{output_filename}'\n")
+
+
+async def download_with_httpx(urls):
+    """
+    使用 httpx.AsyncClient 並行下載所有網址，不需啟動瀏覽器。
+    """
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS)
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=HTTP_TIMEOUT_SECONDS, follow_redirects=True) as client:
+        results = await asyncio.gather(
+            *(fetch(client, url, i + 1, len(urls)) for i, url in enumerate(urls)),
+            return_exceptions=True
+        )
+
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            print(f"錯誤：處理網址時發生未預期的錯誤: {url}\n{result}\n")
+
+
+async def download_judgments():
+    """
+    主執行函式：讀取網址清單，依頁面是否需要 JavaScript 選擇 HTTP 或 Playwright 抓取。
     """
     # 檢查 url.txt 是否存在
     if not os.path.exists(URL_FILE):
@@ -37,54 +224,12 @@ def download_with_selenium():
         urls = [line.strip() for line in f if line.strip()]
 
     print(f"從 '{URL_FILE}' 中讀取到 {len(urls)} 個網址。")
-    
-    # 初始化 Chrome 瀏覽器
-    driver = webdriver.Chrome()
-    print("Chrome 瀏覽器已啟動...")
-    print("-" * 20)
 
-    try:
-        # 迴圈處理每一個網址
-        for i, url in enumerate(urls):
-            print(f"正在處理第 {i+1}/{len(urls)} 個網址: {url}")
-
-            # 瀏覽器前往目標網址
-            driver.get(url)
-
-            # 等待幾秒讓動態內容渲染
-            print(f"頁面載入，等待 {WAIT_SECONDS} 秒...")
-            time.sleep(WAIT_SECONDS)
-
-            try:
-                # 使用 XPath 尋找指定的元素
-                content_element = driver.find_element(By.XPATH, XPATH_SELECTOR)
-                
-                # 提取該元素的完整 HTML
-                content_html = content_element.get_attribute('innerText')
-
-                # 建立輸出檔案名稱，副檔名改回 .txt
-                output_filename = os.path.join(OUTPUT_DIR, f'content_{i+1}.txt')
-
-                # --- 【修改點】---
-                # 將網址和 HTML 內容寫入同一個 txt 檔案
-                with open(output_filename, 'w', encoding='utf-8') as outfile:
-                    # 第一行寫入來源網址
-                    outfile.write(f"{url}\n")
-                    # 第二行寫入分隔線
-                    outfile.write("---\n")
-                    # 接著寫入完整的 HTML 內容
-                    outfile.write(content_html)
-
-                print(f"成功提取資料並儲存至 '{output_filename}'\n")
-
-            except NoSuchElementException:
-                print(f"警告：在此網址上找不到指定的 XPath 元素: {url}\n")
-            
-    finally:
-        # 無論程式是否出錯，最後都確保關閉瀏覽器
-        print("所有網址處理完畢，關閉瀏覽器。")
-        driver.quit()
+    if REQUIRES_JS:
+        await download_with_playwright(urls)
+    else:
+        await download_with_httpx(urls)
 
 # 當這個檔案被直接執行時，才執行主函式
 if __name__ == "__main__":
-    download_with_selenium()
\ No newline at end of file
+    asyncio.run(download_judgments())
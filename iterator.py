@@ -1,11 +1,12 @@
 import streamlit as st
-import json
+import orjson
 import uuid
 import os
 import openai
 from dotenv import load_dotenv
-from pydantic import BaseModel, create_model, ValidationError
-from typing import List, Optional, Type
+from strict_schema import to_strict_json_schema
+from pydantic import BaseModel, TypeAdapter, create_model, ValidationError
+from typing import List, Optional, Tuple, Type
 
 # --- 0. 環境設定與 OpenAI 初始化 ---
 # 載入 .env 檔案中的環境變數
@@ -31,7 +32,13 @@ def render_fields_recursively(fields_dict, path_prefix):
     """
     遞迴地渲染欄位。
     """
-    for field_id, field_data in list(fields_dict.items()):
+    # 刪除按鈕只記下欄位 id 並重跑，實際刪除在下一輪渲染開始時進行，
+    # 因此迴圈期間不會修改 fields_dict，可直接迭代而不必每層都複製一份
+    pending_delete = st.session_state.get("_pending_delete")
+    if pending_delete in fields_dict:
+        del fields_dict[pending_delete]
+        st.session_state._pending_delete = None
+    for field_id, field_data in fields_dict.items():
         unique_key_prefix = f"{path_prefix}_{field_id}"
         cols = st.columns([5, 4, 3, 1])
         field_data['name'] = cols[0].text_input("欄位名稱", value=field_data['name'], key=f"{unique_key_prefix}_name", label_visibility="collapsed")
@@ -40,7 +47,7 @@ def render_fields_recursively(fields_dict, path_prefix):
         is_object_type = field_data['type'] == '物件 (Object)'
         field_data['allow_multiple'] = cols[2].checkbox("允許多個值", value=field_data['allow_multiple'], key=f"{unique_key_prefix}_multi", help="勾選後，此欄位將被視為一個列表 (List)")
         if cols[3].button("❌", key=f"{unique_key_prefix}_del", help="刪除此欄位"):
-            del fields_dict[field_id]
+            st.session_state._pending_delete = field_id
             st.rerun()
         if is_object_type:
             with st.container(border=True):
@@ -71,6 +78,25 @@ def generate_pydantic_model(model_name: str, schema_fields: dict) -> Type[BaseMo
         field_definitions[field_name] = (Optional[final_type], None)
     return create_model(model_name, **field_definitions)
 
+# Streamlit 每次重跑都會重新執行整個腳本，模組層級的 lru_cache 會跟著重建，
+# 因此改用 st.cache_resource，讓動態模型在多次重跑之間都能重用
+@st.cache_resource(max_entries=16)
+def build_output_model(fields_json: bytes) -> Tuple[Type[BaseModel], dict]:
+    """
+    以依原順序序列化的欄位定義 JSON 為鍵，快取動態生成的 Pydantic 模型與對應的 response_format；
+    欄位結構與順序皆未變動時直接重用，不必重新遞迴建立模型。
+    """
+    model = generate_pydantic_model('DynamicOutputModel', orjson.loads(fields_json))
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "DynamicOutputModel",
+            "schema": to_strict_json_schema(TypeAdapter(model).json_schema()),
+            "strict": True
+        }
+    }
+    return model, response_format
+
 def render_results_dynamically(data: dict):
     """
     優雅地呈現分析結果。
@@ -80,19 +106,25 @@ def render_results_dynamically(data: dict):
         if isinstance(value, list):
             if not value: st.write("_(無資料)_")
             elif value and isinstance(value[0], dict): st.dataframe(value, use_container_width=True)
-            else:
-                for item in value: st.markdown(f"- {item}")
+            else: st.markdown("\n".join(f"- {item}" for item in value))
         elif isinstance(value, dict):
             with st.container(border=True): render_results_dynamically(value)
         else: st.write(value)
 
+@st.cache_data(max_entries=4)
+def read_file_cached(file_path, mtime):
+    """
+    以 (路徑, 修改時間) 為鍵快取檔案內容；檔案被改寫後 mtime 改變，快取自然失效。
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
 def load_from_file(file_path):
     """
     如果檔案存在則讀取，否則回傳 None。
     """
     if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return read_file_cached(file_path, os.path.getmtime(file_path))
     return None
 
 def save_to_file(file_path, content):
@@ -177,19 +209,17 @@ if st.button("🚀 執行分析", type="primary", use_container_width=True):
             system_prompt = st.session_state.system_prompt
             raw_input_text = user_prompt_input # 從 widget 直接獲取當前值
             
-            DynamicPydanticModel = generate_pydantic_model('DynamicOutputModel', st.session_state.fields)
-            pydantic_schema = json.dumps(DynamicPydanticModel.model_json_schema(), ensure_ascii=False, indent=2)
+            # 不排序鍵：欄位鍵是 uuid4 字串，排序會打亂 UI 中設定的欄位順序，而此順序決定 schema 與輸出的欄位順序
+            fields_json = orjson.dumps(st.session_state.fields)
+            DynamicPydanticModel, response_format = build_output_model(fields_json)
+            # 輸出結構由 response_format 交給伺服器端強制遵守，不再把 JSON Schema 貼進提示詞
             final_prompt = f"""
             這是需要分析的法律文件：
             ---文件開始---
             {raw_input_text}
             ---文件結束---
 
-            請根據上述文件內容，嚴格按照以下 JSON Schema 格式提取資訊並回傳。
-            你的回覆必須是一個格式完全正確的 JSON 物件，不要包含任何額外說明或 ```json ``` 標籤。
-
-            JSON Schema:
-            {pydantic_schema}
+            請根據上述文件內容提取資訊，並依指定的輸出結構回傳。
             """
             response = client.chat.completions.create(
                 model=st.session_state.selected_model,
@@ -197,15 +227,20 @@ if st.button("🚀 執行分析", type="primary", use_container_width=True):
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": final_prompt}
                 ],
-                response_format={"type": "json_object"}
+                response_format=response_format
             )
-            api_response_str = response.choices[0].message.content
-            st.session_state.raw_json_output = json.loads(api_response_str)
-            validated_data = DynamicPydanticModel(**st.session_state.raw_json_output)
-            st.session_state.validated_pydantic_object = validated_data
-            st.success("分析完成！")
+            message = response.choices[0].message
+            # strict json_schema 下模型拒絕回答時，content 為 None，拒絕原因放在 refusal
+            if message.refusal:
+                st.error(f"模型拒絕依指定結構回應：{message.refusal}")
+            else:
+                api_response_str = message.content
+                st.session_state.raw_json_output = orjson.loads(api_response_str)
+                validated_data = DynamicPydanticModel(**st.session_state.raw_json_output)
+                st.session_state.validated_pydantic_object = validated_data
+                st.success("分析完成！")
         except openai.APIError as e: st.error(f"OpenAI API 錯誤: {e}")
-        except json.JSONDecodeError: st.error("API 回傳的不是有效的 JSON 格式。"); st.code(api_response_str, language="text")
+        except orjson.JSONDecodeError: st.error("API 回傳的不是有效的 JSON 格式。"); st.code(api_response_str, language="text")
         except ValidationError as e:
             st.error("資料驗證失敗！AI 輸出的 JSON 與您的結構定義不符。")
             st.subheader("收到的 JSON 資料:"); st.json(st.session_state.get('raw_json_output', {}))
@@ -0,0 +1,20 @@
+def to_strict_json_schema(schema: dict) -> dict:
+    """
+    將 Pydantic 產生的 JSON Schema 調整為 OpenAI Structured Outputs (strict) 接受的形式：
+    每個物件都禁止額外欄位、所有屬性皆列為必填 (可為 null 者仍保留 null 型別)，並移除不支援的 default/example。
+    summarize.py 與 iterator.py 共用此實作，避免兩份副本各自演變。
+    """
+    schema.pop("default", None)
+    schema.pop("example", None)
+    if "properties" in schema:
+        schema["additionalProperties"] = False
+        schema["required"] = list(schema["properties"])
+        for sub_schema in schema["properties"].values():
+            to_strict_json_schema(sub_schema)
+    if isinstance(schema.get("items"), dict):
+        to_strict_json_schema(schema["items"])
+    for sub_schema in schema.get("anyOf", []):
+        to_strict_json_schema(sub_schema)
+    for sub_schema in schema.get("$defs", {}).values():
+        to_strict_json_schema(sub_schema)
+    return schema
@@ -1,14 +1,57 @@
 import os
-import json
+import orjson
+import time
+import asyncio
 from datetime import date
-from typing import List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel, Field, ValidationError
-from openai import OpenAI
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+from tenacity import RetryCallState, retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 from dotenv import load_dotenv
+from strict_schema import to_strict_json_schema
 
 load_dotenv()
 PROMPT_FILE_PATH = f"{os.getcwd()}/summarize.txt"
 
+# 同時送往 OpenAI 的請求上限，避免一次觸發過多 429
+MAX_CONCURRENCY = 20
+
+# 與 OpenAI 之間的 HTTP/2 連線池設定；併發請求在少數連線上多工，省去重複的 TCP/TLS 握手
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+# 單次請求逾時 (長篇判決的生成可能超過一分鐘)；建立連線則應很快完成
+HTTP_TIMEOUT = httpx.Timeout(300, connect=10)
+
+# 暫時性錯誤 (429、連線中斷、逾時、5xx) 的重試次數上限
+MAX_API_ATTEMPTS = 5
+
+# 值得重試的 OpenAI 例外類型
+RETRYABLE_API_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+# 批次處理多份判決書時改用 OpenAI Batch API (費用減半、獨立的速率限制)；
+# 只處理單一檔案時仍走即時的 async 呼叫
+USE_BATCH_API = True
+
+# 輪詢 Batch 狀態的間隔秒數
+BATCH_POLL_SECONDS = 60
+
+# 供 app 側邊欄使用的案件清單檔名 (與各案件 JSON 放在同一資料夾)
+MANIFEST_FILE = "_manifest.json"
+
+# 記錄已送出但尚未收取結果之 Batch 的檔名；程序中斷後下次執行據此接續，而非重新送出
+PENDING_BATCH_FILE = "_pending_batch.json"
+
+# Batch 不會再變動的最終狀態
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
 
 # --- Pydantic 模型定義 (與前一版相同，保持不變) ---
 
@@ -27,6 +70,22 @@ class AnalyzedDecisionMVP(BaseModel):
     factual_issues: List[str] = Field(..., description="從判決中提煉出的事實爭點列表")
     legal_holdings: List[LegalHoldingMVP] = Field(..., description="法律見解 (Headnotes) 列表")
 
+def build_response_format() -> dict:
+    """以 AnalyzedDecisionMVP 建立 response_format；url 由爬蟲提供，不交由模型生成"""
+    schema = AnalyzedDecisionMVP.model_json_schema()
+    del schema["properties"]["url"]
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "AnalyzedDecisionMVP",
+            "schema": to_strict_json_schema(schema),
+            "strict": True
+        }
+    }
+
+# 由伺服器端強制模型輸出符合此結構的 JSON
+RESPONSE_FORMAT = build_response_format()
+
 
 # --- 輔助函數 ---
 
@@ -41,39 +100,309 @@ def get_txt_files(folder: str) -> List[str]:
     """獲取指定文件夾中所有的 .txt 文件路徑"""
     return [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.txt')]
 
+@lru_cache(maxsize=4)
+def read_text_cached(file_path: str, mtime: float) -> str:
+    """以 (路徑, 修改時間) 為鍵快取檔案內容；檔案被修改後 mtime 改變即重新讀取"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read()
+
 def load_system_prompt(file_path: str) -> str:
     """從外部檔案載入 System Prompt"""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
+        return read_text_cached(file_path, os.path.getmtime(file_path))
     except FileNotFoundError:
         print(f"錯誤：System Prompt 檔案 '{file_path}' 不存在。請確認檔案路徑是否正確。")
         raise
 
-def call_gpt4(client: OpenAI, content: str, system_prompt: str) -> Optional[str]:
+def read_judgment(txt_path: str) -> Optional[Tuple[str, str]]:
+    """讀取爬蟲產生的 txt 檔：第一行為 URL，其餘為判決內文"""
+    with open(txt_path, "r", encoding="utf-8") as f:
+        url = f.readline().strip()
+        content = f.read()
+
+    if not url or not content:
+        print(f"警告：{txt_path} 的 URL 或內容為空，跳過處理。")
+        return None
+    return url, content
+
+def build_chat_request(content: str, system_prompt: str) -> dict:
+    """組出 chat.completions 的請求參數，供即時呼叫與 Batch API 共用"""
+    return {
+        # Structured Outputs (json_schema + strict) 需 gpt-4o 以上的模型
+        "model": "gpt-4o",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content}
+        ],
+        "response_format": RESPONSE_FORMAT,
+        "temperature": 0.1,
+        "max_tokens": 4096
+    }
+
+def log_retry(retry_state: RetryCallState) -> None:
+    """在 tenacity 重試前印出失敗原因與等待時間"""
+    print(
+        f"警告：呼叫 OpenAI API 失敗 ({retry_state.outcome.exception()})，"
+        f"{retry_state.next_action.sleep:.1f} 秒後進行第 {retry_state.attempt_number + 1} 次嘗試..."
+    )
+
+@retry(
+    stop=stop_after_attempt(MAX_API_ATTEMPTS),
+    wait=wait_exponential_jitter(initial=1, max=30),
+    retry=retry_if_exception_type(RETRYABLE_API_ERRORS),
+    before_sleep=log_retry,
+    reraise=True
+)
+async def request_completion(client: AsyncOpenAI, content: str, system_prompt: str) -> Optional[str]:
+    """送出單次 chat.completions 請求；暫時性錯誤會以指數退避 (含 jitter) 自動重試"""
+    response = await client.chat.completions.create(**build_chat_request(content, system_prompt))
+    message = response.choices[0].message
+    # strict json_schema 下模型拒絕回答時，content 為 None，拒絕原因放在 refusal
+    if message.refusal:
+        print(f"錯誤：模型拒絕依指定結構回應：{message.refusal}")
+        return None
+    return message.content
+
+async def call_gpt4(client: AsyncOpenAI, content: str, system_prompt: str) -> Optional[str]:
     """使用載入的 System Prompt 呼叫 GPT-4"""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": content}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1,
-            max_tokens=4096
-        )
-        return response.choices[0].message.content
+        return await request_completion(client, content, system_prompt)
     except Exception as e:
         print(f"呼叫 OpenAI API 時發生錯誤：{e}")
         return None
 
+def load_existing_analysis(txt_path: str, output_folder: str) -> Optional[AnalyzedDecisionMVP]:
+    """
+    對應的輸出 JSON 已存在且能通過 AnalyzedDecisionMVP 驗證時，視為已處理完成並回傳驗證後的模型；
+    否則回傳 None。回傳的模型可直接用於產生案件清單，不必再讀一次檔案。
+    """
+    base_name = os.path.splitext(os.path.basename(txt_path))[0]
+    out_path = os.path.join(output_folder, f"{base_name}.json")
+    if not os.path.exists(out_path):
+        return None
+    try:
+        with open(out_path, "rb") as f:
+            return AnalyzedDecisionMVP.model_validate_json(f.read())
+    except ValidationError:
+        print(f"警告：{out_path} 驗證失敗，將重新處理。")
+        return None
+
+def write_json_atomic(out_path: str, data) -> None:
+    """以單次緩衝寫入暫存檔後再用 os.replace 原子性替換，讀取端不會看到寫到一半的檔案"""
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb", buffering=1 << 20) as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, out_path)
+
+def save_analysis(base_name: str, url: str, gpt_output: str, output_folder: str) -> Optional[AnalyzedDecisionMVP]:
+    """解析 GPT 輸出、補上來源 URL，經 Pydantic 驗證後存成 JSON；成功時回傳驗證後的模型"""
+    try:
+        data = orjson.loads(gpt_output)
+        data['url'] = url
+
+        analyzed = AnalyzedDecisionMVP(**data)
+
+        out_path = os.path.join(output_folder, f"{base_name}.json")
+        write_json_atomic(out_path, analyzed.model_dump())
+
+        print(f"成功儲存分析結果至 {out_path}")
+        return analyzed
+
+    except orjson.JSONDecodeError as e:
+        print(f"JSON 解析錯誤：{e}\n收到的原始輸出：\n{gpt_output}")
+    except ValidationError as e:
+        print(f"Pydantic 驗證錯誤：{e}")
+    except Exception as e:
+        print(f"處理 {base_name} 時發生未預期的錯誤：{e}")
+    return None
+
+# --- Batch API 流程 ---
+
+def build_batch_jsonl(txt_files: List[str], system_prompt: str) -> Tuple[bytes, Dict[str, str]]:
+    """
+    將所有判決書組成 Batch API 的輸入 JSONL (每個檔案一行)。
+    回傳 JSONL 內容，以及 custom_id (檔名) 對應來源 URL 的字典。
+    """
+    lines = []
+    urls = {}
+    for txt_path in txt_files:
+        judgment = read_judgment(txt_path)
+        if judgment is None:
+            continue
+        url, content = judgment
+        base_name = os.path.splitext(os.path.basename(txt_path))[0]
+        urls[base_name] = url
+        lines.append(orjson.dumps({
+            "custom_id": base_name,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": build_chat_request(content, system_prompt)
+        }))
+    return b"\n".join(lines), urls
+
+def submit_batch(client: OpenAI, txt_files: List[str], system_prompt: str, output_folder: str) -> bool:
+    """上傳 JSONL 建立 Batch，並在開始輪詢前記錄 batch id 與 URL 對照；沒有可送出的檔案時回傳 False"""
+    batch_jsonl, urls = build_batch_jsonl(txt_files, system_prompt)
+    if not urls:
+        print("警告：沒有可送出的判決書。")
+        return False
+
+    batch_file = client.files.create(file=("batch_input.jsonl", batch_jsonl), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    write_json_atomic(os.path.join(output_folder, PENDING_BATCH_FILE), {"batch_id": batch.id, "urls": urls})
+    print(f"已建立 Batch {batch.id}，共 {len(urls)} 份判決書。")
+    return True
+
+def save_batch_results(output: str, urls: Dict[str, str], output_folder: str) -> Dict[str, AnalyzedDecisionMVP]:
+    """逐行解析 Batch 輸出並儲存；單行格式異常只略過該行，不影響其餘結果。回傳檔名對應驗證後模型的字典"""
+    analyses = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            result = orjson.loads(line)
+            base_name = result["custom_id"]
+            response = result.get("response")
+            if result.get("error") or not response or response["status_code"] != 200:
+                print(f"錯誤：{base_name} 的請求失敗：{result.get('error') or response}")
+                continue
+            message = response["body"]["choices"][0]["message"]
+            gpt_output = message["content"]
+            url = urls[base_name]
+        except (orjson.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+            print(f"錯誤：無法解析 Batch 輸出中的一行 ({e!r})：{line[:200]}")
+            continue
+        if message.get("refusal"):
+            print(f"錯誤：模型拒絕分析 {base_name}：{message['refusal']}")
+            continue
+        if not gpt_output:
+            print(f"錯誤：{base_name} 的回應沒有內容，略過。")
+            continue
+        analyzed = save_analysis(base_name, url, gpt_output, output_folder)
+        if analyzed:
+            analyses[base_name] = analyzed
+    return analyses
+
+def collect_batch(client: OpenAI, output_folder: str) -> Dict[str, AnalyzedDecisionMVP]:
+    """依記錄檔輪詢 Batch 至最終狀態，收取並儲存結果後移除記錄檔；回傳成功儲存的分析結果"""
+    pending_path = os.path.join(output_folder, PENDING_BATCH_FILE)
+    with open(pending_path, "rb") as f:
+        pending = orjson.loads(f.read())
+
+    batch = client.batches.retrieve(pending["batch_id"])
+    print(f"等待 Batch {batch.id} 完成 (可隨時中斷，下次執行會接續收取結果)...")
+    while batch.status not in BATCH_TERMINAL_STATUSES:
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = client.batches.retrieve(batch.id)
+        print(f"Batch {batch.id} 狀態：{batch.status}")
+
+    analyses = {}
+    if batch.status == "completed" and batch.output_file_id:
+        if batch.request_counts and batch.request_counts.failed:
+            print(f"警告：Batch 中有 {batch.request_counts.failed} 筆請求失敗，詳見錯誤檔 {batch.error_file_id}。")
+        analyses = save_batch_results(client.files.content(batch.output_file_id).text, pending["urls"], output_folder)
+    else:
+        print(f"錯誤：Batch {batch.id} 結束於狀態 '{batch.status}'，沒有可用的輸出。")
+
+    # Batch 已到最終狀態，能收的結果都已收取；未成功的檔案會在下次執行時重新送出
+    os.remove(pending_path)
+    return analyses
+
+def run_batch(client: OpenAI, txt_files: List[str], system_prompt: str, output_folder: str) -> Dict[str, AnalyzedDecisionMVP]:
+    """送出 Batch 並等待收取結果"""
+    if submit_batch(client, txt_files, system_prompt, output_folder):
+        return collect_batch(client, output_folder)
+    return {}
+
+# --- 即時 (async) 流程 ---
+
+async def process_one(client: AsyncOpenAI, txt_path: str, system_prompt: str, output_folder: str, sem: asyncio.Semaphore) -> Optional[AnalyzedDecisionMVP]:
+    """處理單一判決書：呼叫 GPT-4 分析並儲存為 JSON；成功時回傳驗證後的模型"""
+    print(f"--- 開始處理 {txt_path} ---")
+    try:
+        judgment = read_judgment(txt_path)
+        if judgment is None:
+            return None
+        url, content = judgment
+
+        # 以 semaphore 限制同時進行中的 API 請求數量
+        async with sem:
+            gpt_output = await call_gpt4(client, content, system_prompt)
+
+        if not gpt_output:
+            print(f"錯誤：從 OpenAI 未收到 {txt_path} 的回應，處理失敗。")
+            return None
+
+        base_name = os.path.splitext(os.path.basename(txt_path))[0]
+        return save_analysis(base_name, url, gpt_output, output_folder)
+    finally:
+        print(f"--- 完成處理 {txt_path} ---\n")
+
+def create_async_client(api_key: str) -> AsyncOpenAI:
+    """建立以 HTTP/2 連線池連往 OpenAI 的 AsyncOpenAI client"""
+    http_client = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    # 重試交由 tenacity 處理，關閉 SDK 內建重試以免次數相乘
+    return AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+async def run_concurrent(client: AsyncOpenAI, txt_files: List[str], system_prompt: str, output_folder: str) -> Dict[str, AnalyzedDecisionMVP]:
+    """以 asyncio.gather 同時處理所有檔案，由 semaphore 控制實際併發數；回傳檔名對應驗證後模型的字典"""
+    # return_exceptions=True 讓單一檔案失敗不會中斷整批；結束時關閉 client 釋放連線池
+    async with client:
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        tasks = [process_one(client, txt_path, system_prompt, output_folder, sem) for txt_path in txt_files]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    analyses = {}
+    for txt_path, result in zip(txt_files, results):
+        if isinstance(result, Exception):
+            print(f"處理 {txt_path} 時發生未預期的錯誤：{result}")
+        elif result:
+            analyses[os.path.splitext(os.path.basename(txt_path))[0]] = result
+    return analyses
+
+# --- 案件清單 ---
+
+def write_manifest(output_folder: str, analyses: Dict[str, AnalyzedDecisionMVP]) -> None:
+    """
+    彙整輸出資料夾中所有有效的分析結果，寫出只含案號、案由、URL 與檔名的輕量案件清單；
+    app 的側邊欄只需載入此清單，完整 JSON 待使用者選取時才讀取。
+    analyses 為本次執行已驗證過的結果 (檔名 -> 模型)，直接沿用；只有不在其中的檔案
+    (例如輸入資料夾已無對應 txt 的舊案件) 才會讀取並驗證。
+    """
+    entries = []
+    for file_name in sorted(os.listdir(output_folder)):
+        # 底線開頭的是清單、Batch 記錄等內部檔案，不是案件 JSON
+        if not file_name.endswith('.json') or file_name.startswith('_'):
+            continue
+        base_name = os.path.splitext(file_name)[0]
+        analyzed = analyses.get(base_name)
+        if analyzed is None:
+            try:
+                with open(os.path.join(output_folder, file_name), "rb") as f:
+                    analyzed = AnalyzedDecisionMVP.model_validate_json(f.read())
+            except ValidationError as e:
+                print(f"警告：{file_name} 驗證失敗，不納入案件清單：{e}")
+                continue
+        entries.append({
+            "case_number": analyzed.case_number,
+            "case_reason": analyzed.case_reason,
+            "url": analyzed.url,
+            "base_name": base_name
+        })
+
+    manifest_path = os.path.join(output_folder, MANIFEST_FILE)
+    write_json_atomic(manifest_path, entries)
+    print(f"已將 {len(entries)} 筆案件寫入 {manifest_path}")
+
 # --- 主執行流程 ---
 
 def main():
     try:
         api_key = get_openai_api_key()
-        client = OpenAI(api_key=api_key)
         
         # 定義檔案路徑
         input_folder = "selenium_scraped_txt"
@@ -85,50 +414,40 @@ def main():
         system_prompt = load_system_prompt(prompt_file_path)
         
         os.makedirs(output_folder, exist_ok=True)
+
+        # 本次執行中已驗證過的分析結果 (檔名 -> 模型)，供產生案件清單時直接沿用
+        analyses = {}
+
+        # 上次送出的 Batch 尚未收取 (例如輪詢時被中斷) 時，先收取其結果，避免同一批檔案重複送出、重複付費
+        if os.path.exists(os.path.join(output_folder, PENDING_BATCH_FILE)):
+            print("發現尚未收取結果的 Batch，先接續處理...")
+            analyses.update(collect_batch(OpenAI(api_key=api_key), output_folder))
+
         txt_files = get_txt_files(input_folder)
         
         if not txt_files:
             print(f"警告：在資料夾 '{input_folder}' 中找不到任何 .txt 檔案。")
             return
 
+        # 已有有效分析結果的檔案不再送出，避免重複花費 token
+        pending_files = []
         for txt_path in txt_files:
-            print(f"--- 開始處理 {txt_path} ---")
-            try:
-                with open(txt_path, "r", encoding="utf-8") as f:
-                    url = f.readline().strip()
-                    content = f.read()
-
-                if not url or not content:
-                    print(f"警告：{txt_path} 的 URL 或內容為空，跳過處理。")
-                    continue
-
-                gpt_output = call_gpt4(client, content, system_prompt)
-                
-                if not gpt_output:
-                    print(f"錯誤：從 OpenAI 未收到回應，處理失敗。")
-                    continue
-
-                data = json.loads(gpt_output)
-                data['url'] = url
-                
-                analyzed = AnalyzedDecisionMVP(**data)
-                
-                base_name = os.path.splitext(os.path.basename(txt_path))[0]
-                out_path = os.path.join(output_folder, f"{base_name}.json")
-                
-                with open(out_path, "w", encoding="utf-8") as out_f:
-                    out_f.write(analyzed.model_dump_json(indent=2))
-                    
-                print(f"成功儲存分析結果至 {out_path}")
-
-            except json.JSONDecodeError as e:
-                print(f"JSON 解析錯誤：{e}\n收到的原始輸出：\n{gpt_output}")
-            except ValidationError as e:
-                print(f"Pydantic 驗證錯誤：{e}")
-            except Exception as e:
-                print(f"處理檔案時發生未預期的錯誤：{e}")
-            finally:
-                print(f"--- 完成處理 {txt_path} ---\n")
+            base_name = os.path.splitext(os.path.basename(txt_path))[0]
+            analyzed = analyses.get(base_name) or load_existing_analysis(txt_path, output_folder)
+            if analyzed:
+                analyses[base_name] = analyzed
+            else:
+                pending_files.append(txt_path)
+        print(f"共 {len(txt_files)} 份判決書，其中 {len(txt_files) - len(pending_files)} 份已有有效的分析結果，略過處理。")
+
+        if not pending_files:
+            print("沒有需要處理的檔案。")
+        elif USE_BATCH_API and len(pending_files) > 1:
+            analyses.update(run_batch(OpenAI(api_key=api_key), pending_files, system_prompt, output_folder))
+        else:
+            analyses.update(asyncio.run(run_concurrent(create_async_client(api_key), pending_files, system_prompt, output_folder)))
+
+        write_manifest(output_folder, analyses)
 
     except ValueError as e:
         # 捕捉 API Key 或 Prompt 檔案不存在的錯誤